@@ -1,7 +1,10 @@
 import os
 import io
 import base64
+import functools
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Optional, Literal, cast, List, Dict
 from langchain_openai import ChatOpenAI
 from langchain import agents
@@ -39,6 +42,25 @@ except ImportError:
     logger.warning("Skills system not available - skills/ directory missing or skill_manager.py not found")
 
 
+# Verb groups for the tool summary logged after setup
+_READ_TOOL_RE = re.compile("GET|LIST|RETRIEVE|FETCH|SEARCH|QUERY")
+_CREATE_TOOL_RE = re.compile("CREATE|ADD")
+
+
+# SDK clients hold their own HTTP connection pools and are safe to share, so
+# every per-user kernel reuses one client per API key instead of paying a new
+# TCP/TLS handshake for each user.
+@functools.lru_cache(maxsize=None)
+def _get_openrouter_client(api_key: str) -> OpenAI:
+    return OpenAI(api_key=api_key, base_url="https://openrouter.ai/api/v1")
+
+
+@functools.lru_cache(maxsize=None)
+def _get_composio_client(api_key: str) -> Composio:
+    # WITH LangchainProvider for proper tool conversion
+    return Composio(api_key=api_key, provider=LangchainProvider())
+
+
 class AgentKernel:
     """
     The Kernel - Core AI Agent Engine
@@ -83,15 +105,9 @@ class AgentKernel:
         self.image_client = None
         
         if self.api_key:
-            self.openai_client = OpenAI(
-                api_key=self.api_key,
-                base_url="https://openrouter.ai/api/v1"
-            )
-            # Image client uses same OpenRouter endpoint
-            self.image_client = OpenAI(
-                api_key=self.api_key,
-                base_url="https://openrouter.ai/api/v1"
-            )
+            self.openai_client = _get_openrouter_client(self.api_key)
+            # Image client uses same OpenRouter endpoint (and connection pool)
+            self.image_client = self.openai_client
         
         # Active apps/toolkits for Composio
         self.active_apps = []
@@ -172,11 +188,8 @@ class AgentKernel:
         # Initialize Composio client and session if not ready
         if not self.composio_client:
             try:
-                # Create Composio client WITH LangchainProvider for proper tool conversion
-                self.composio_client = Composio(
-                    api_key=self.composio_api_key,
-                    provider=LangchainProvider()
-                )
+                # Process-wide Composio client; only the session is per user
+                self.composio_client = _get_composio_client(self.composio_api_key)
                 logger.info("Composio client initialized with LangchainProvider")
                 
                 # Create session for this user (official pattern from docs)
@@ -202,17 +215,16 @@ class AgentKernel:
         if not self.active_apps and self.composio_client:
             try:
                 logger.info("No apps specified - auto-detecting connected apps...")
-                connected_accounts = self.composio_client.connected_accounts.list(
-                    user_ids=[self.user_id]
-                )
+                connected_accounts = self._list_active_accounts()
                 
-                # Get unique toolkit slugs from ACTIVE connections
-                connected_slugs = set()
-                for account in connected_accounts.items:
-                    if account.status == "ACTIVE" and hasattr(account, 'toolkit') and account.toolkit:
-                        toolkit_slug = getattr(account.toolkit, 'slug', '').upper()
-                        if toolkit_slug:
-                            connected_slugs.add(toolkit_slug)
+                # Get unique toolkit slugs from ACTIVE connections in one pass;
+                # inactive accounts are rejected before touching toolkit
+                connected_slugs = {
+                    getattr(account.toolkit, 'slug', '').upper()
+                    for account in connected_accounts.items
+                    if account.status == "ACTIVE" and getattr(account, 'toolkit', None)
+                }
+                connected_slugs.discard('')
                 
                 if connected_slugs:
                     self.active_apps = list(connected_slugs)
@@ -294,8 +306,8 @@ class AgentKernel:
                     ],
                 }
                 
-                all_tools = []
-                for app_slug in self.active_apps:
+                def fetch_app_tools(app_slug):
+                    app_tools = []
                     # Step 1: Get default toolkit tools (CREATE/ADD/DELETE operations)
                     try:
                         toolkit_tools = self.composio_client.tools.get(
@@ -303,7 +315,7 @@ class AgentKernel:
                             toolkits=[app_slug]
                         )
                         logger.info(f"Got {len(toolkit_tools)} default tools for {app_slug}")
-                        all_tools.extend(toolkit_tools)
+                        app_tools.extend(toolkit_tools)
                     except ValueError as e:
                         # Handle invalid parameter names like '$count'
                         if "'$" in str(e) and "is not a valid parameter name" in str(e):
@@ -316,7 +328,19 @@ class AgentKernel:
                     # Step 2: Get essential GET/LIST/READ tools explicitly
                     get_tool_names = essential_get_tools.get(app_slug.upper(), [])
                     if get_tool_names:
-                        # Try each tool individually to skip problematic ones
+                        try:
+                            # Fetch the whole list in one round-trip
+                            get_tools = self.composio_client.tools.get(
+                                user_id=self.user_id,
+                                tools=get_tool_names
+                            )
+                            logger.info(f"✓ Loaded {len(get_tools)}/{len(get_tool_names)} essential tools for {app_slug}")
+                            app_tools.extend(get_tools)
+                            get_tool_names = []
+                        except Exception as e:
+                            logger.warning(f"Batch load of essential tools for {app_slug} failed, retrying one by one: {e}")
+                        
+                        # Fallback: try each tool individually to skip problematic ones
                         for tool_name in get_tool_names:
                             try:
                                 get_tools = self.composio_client.tools.get(
@@ -325,7 +349,7 @@ class AgentKernel:
                                 )
                                 if get_tools:
                                     logger.info(f"✓ Loaded {tool_name}")
-                                    all_tools.extend(get_tools)
+                                    app_tools.extend(get_tools)
                             except ValueError as e:
                                 # Handle invalid parameter names
                                 if "'$" in str(e) and "is not a valid parameter name" in str(e):
@@ -335,6 +359,12 @@ class AgentKernel:
                             except Exception as e:
                                 logger.warning(f"✗ Failed to load {tool_name}: {e}")
                                 # This is OK - some tools might not exist for this integration
+                    return app_tools
+                
+                # Apps are fetched independently, so overlap their Composio round-trips
+                with ThreadPoolExecutor(max_workers=min(8, len(self.active_apps))) as pool:
+                    per_app_tools = list(pool.map(fetch_app_tools, self.active_apps))
+                all_tools = [tool for app_tools in per_app_tools for tool in app_tools]
                 
                 composio_tools = all_tools
                 logger.info(f"Total tools loaded: {len(composio_tools)} for toolkits: {self.active_apps}")
@@ -343,17 +373,19 @@ class AgentKernel:
                 if composio_tools:
                     tool_names = []
                     for tool in composio_tools:
-                        # LangChain tools have a 'name' attribute
-                        if hasattr(tool, 'name'):
-                            tool_names.append(tool.name)
+                        # LangChain tools have a 'name' attribute; read it once
+                        name = getattr(tool, 'name', None)
+                        if name is not None:
+                            tool_names.append(name)
                         elif isinstance(tool, dict):
-                            func_info = tool.get('function', {})
-                            tool_names.append(func_info.get('name', 'unknown'))
+                            # Avoid allocating a throwaway {} default per tool
+                            func_info = tool.get('function')
+                            tool_names.append(func_info.get('name', 'unknown') if func_info else 'unknown')
                     
                     # Log summary by category
-                    get_tools = [n for n in tool_names if 'GET' in n or 'LIST' in n or 'RETRIEVE' in n or 'FETCH' in n or 'SEARCH' in n or 'QUERY' in n]
-                    create_tools = [n for n in tool_names if 'CREATE' in n or 'ADD' in n]
-                    logger.info(f"Tool summary: {len(get_tools)} GET/LIST/READ, {len(create_tools)} CREATE/ADD, {len(tool_names)} total")
+                    read_count = sum(1 for n in tool_names if _READ_TOOL_RE.search(n))
+                    create_count = sum(1 for n in tool_names if _CREATE_TOOL_RE.search(n))
+                    logger.info(f"Tool summary: {read_count} GET/LIST/READ, {create_count} CREATE/ADD, {len(tool_names)} total")
                     logger.info(f"Sample tools: {', '.join(tool_names[:10])}...")
                     
             except Exception as e:
@@ -1445,6 +1477,22 @@ App name:""")
             logger.error(f"Transcription Error: {e}")
             return ""
 
+    def _list_active_accounts(self):
+        """List this user's connected accounts, filtering to ACTIVE server-side.
+        
+        Older SDKs without the statuses filter get the unfiltered list, so
+        callers still check account.status themselves.
+        """
+        try:
+            return self.composio_client.connected_accounts.list(
+                user_ids=[self.user_id],
+                statuses=["ACTIVE"]
+            )
+        except TypeError:
+            return self.composio_client.connected_accounts.list(
+                user_ids=[self.user_id]
+            )
+    
     def check_connection(self, app_name: str) -> bool:
         """Check if user has an active connection for the given app.
         
@@ -1489,15 +1537,13 @@ App name:""")
         
         try:
             # ✅ RELIABLE METHOD: Use connected_accounts.list() with user_id filter
-            connected_accounts = self.composio_client.connected_accounts.list(
-                user_ids=[self.user_id]
-            )
+            connected_accounts = self._list_active_accounts()
             
             # Check if any account matches this app and is ACTIVE
             for account in connected_accounts.items:
                 if account.status == "ACTIVE":
                     # Check toolkit slug
-                    if hasattr(account, 'toolkit') and account.toolkit:
+                    if getattr(account, 'toolkit', None):
                         toolkit_slug = getattr(account.toolkit, 'slug', '').lower()
                         # Check both the actual slug and the original slug
                         if toolkit_slug == actual_slug or toolkit_slug == slug:
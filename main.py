@@ -15,10 +15,12 @@ Benefits:
 
 import asyncio
 import os
+import random
 import base64
 import httpx
 import tempfile
 import re
+from collections import OrderedDict
 from typing import Any, Optional
 from dotenv import load_dotenv
 
@@ -33,6 +35,13 @@ import uvicorn
 
 # Import our Kernel
 from kernel import AgentKernel
+from message_pipeline import (
+    content_key,
+    get_or_create,
+    mark_processed,
+    run_coalesced,
+    run_for_user,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -44,19 +53,34 @@ USER_PHONE = os.environ.get("USER_PHONE")
 WPP_BRIDGE_URL = os.environ.get("WPP_BRIDGE_URL", "http://localhost:3001")
 ENABLE_SCHEDULER = os.environ.get("ENABLE_SCHEDULER", "false").lower() == "true"
 
+WPP_BRIDGE_WAIT_SECONDS = 60
+WPP_BRIDGE_MIN_BACKOFF = 0.5
+WPP_BRIDGE_MAX_BACKOFF = 5.0
+MAX_USER_KERNELS = int(os.environ.get("MAX_USER_KERNELS", 200))
+
 # Per-user kernel management (each WhatsApp user gets their own session)
-user_kernels = {}  # phone_number/chat_id -> AgentKernel
+# Kept as an LRU so a long-running bot doesn't hold one kernel per chat forever
+user_kernels: "OrderedDict[str, AgentKernel]" = OrderedDict()  # phone_number/chat_id -> AgentKernel
+
+def _create_kernel(user_id: str) -> AgentKernel:
+    kernel = AgentKernel(user_id=user_id)
+    # Initialize with common apps pre-loaded
+    kernel.setup(apps=["gmail", "googlecalendar", "googlesheets", "notion", "anchor_browser"])
+    return kernel
+
 
-def get_kernel_for_user(user_id: str) -> AgentKernel:
-    """Get or create a kernel instance for a specific user."""
-    if user_id not in user_kernels:
-        logger.info(f"🔧 Creating new kernel for user: {user_id}")
-        user_kernels[user_id] = AgentKernel(user_id=user_id)
-        # Initialize with common apps pre-loaded
-        user_kernels[user_id].setup(apps=["gmail", "googlecalendar", "googlesheets", "notion", "anchor_browser"])
-    return user_kernels[user_id]
+async def get_kernel_for_user(user_id: str) -> AgentKernel:
+    """Get or create a kernel instance for a specific user.
+
+    Creating one makes several Composio calls, so it runs in a worker thread
+    under the chat's lock instead of stalling every other chat.
+    """
+    return await get_or_create(user_kernels, user_id, _create_kernel, MAX_USER_KERNELS)
 
 # Default kernel for backward compatibility (scheduler, etc.)
+# Its calls go through run_for_user under this fixed key, so /add-app can't
+# rebuild the agent while the scheduler is inside run()
+DEFAULT_KERNEL_KEY = "__default__"
 agent_kernel = AgentKernel()
 # Initialize with common apps pre-loaded
 agent_kernel.setup(apps=["gmail", "googlecalendar", "googlesheets", "notion", "anchor_browser"])
@@ -64,9 +88,18 @@ agent_kernel.setup(apps=["gmail", "googlecalendar", "googlesheets", "notion", "a
 # HTTP client for WPP Bridge
 http_client: Optional[httpx.AsyncClient] = None
 
-# Message tracking
-processed_messages = set()
-
+# WhatsApp message types that carry nothing to answer (security notices,
+# group events, call logs, deletions); these never reach the kernel
+NON_REPLYABLE_TYPES = frozenset({
+    "e2e_notification",
+    "notification",
+    "notification_template",
+    "gp2",
+    "call_log",
+    "revoked",
+    "protocol",
+    "ciphertext",
+})
 
 # --- Pydantic Models ---
 class IncomingMessage(BaseModel):
@@ -207,6 +240,28 @@ async def wpp_get_status() -> dict:
 
 
 # --- Message Processing ---
+# Image intent keywords, each list compiled into one alternation so a message
+# is scanned once per group instead of once per keyword.
+IMAGE_VISUAL_NOUNS = ("image", "picture", "photo", "illustration", "art", "drawing", "artwork", "painting", "sketch")
+IMAGE_EXPLICIT_PATTERNS = (
+    "image of", "picture of", "photo of", "illustration of", "art of",
+    "drawing of", "painting of", "sketch of",
+)
+IMAGE_GENERATION_VERBS = ("generate", "create", "make", "draw", "render", "design", "produce")
+IMAGE_SHOW_PATTERNS = ("show me a picture", "show me an image", "show me a photo")
+
+
+def _compile_keywords(keywords) -> "re.Pattern[str]":
+    """Compile plain substrings into a single regex alternation."""
+    return re.compile("|".join(re.escape(k) for k in keywords))
+
+
+_VISUAL_NOUN_RE = _compile_keywords(IMAGE_VISUAL_NOUNS)
+_EXPLICIT_PATTERN_RE = _compile_keywords(IMAGE_EXPLICIT_PATTERNS)
+_GENERATION_VERB_RE = _compile_keywords(IMAGE_GENERATION_VERBS)
+_SHOW_PATTERN_RE = _compile_keywords(IMAGE_SHOW_PATTERNS)
+
+
 def _extract_image_prompt(text: str) -> Optional[str]:
     """Extract image generation prompt from message."""
     if not text:
@@ -218,42 +273,28 @@ def _extract_image_prompt(text: str) -> Optional[str]:
     lowered = trimmed.lower()
 
     # 1. Check for /image command first (highest priority)
-    if lowered.startswith("/image") or lowered.startswith("/img"):
+    if lowered.startswith(("/image", "/img")):
         return trimmed.replace("/image", "").replace("/img", "").strip()
 
-    # 2. EXPLICIT image keywords - must have these to be considered image generation
-    visual_nouns = ["image", "picture", "photo", "illustration", "art", "drawing", "artwork", "painting", "sketch"]
-    has_visual_noun = any(noun in lowered for noun in visual_nouns)
-    
-    # 3. Check for explicit "image of..." patterns (highest confidence)
-    explicit_patterns = [
-        "image of", "picture of", "photo of", "illustration of", "art of",
-        "drawing of", "painting of", "sketch of"
-    ]
-    for pattern in explicit_patterns:
-        if pattern in lowered:
-            logger.info(f"🎨 Detected image request (explicit pattern): {trimmed[:50]}...")
-            return trimmed
-    
-    # 4. Check for "generate/create/make/draw" + explicit visual noun
-    # This prevents "create a spreadsheet" from being treated as image generation
-    generation_verbs = ["generate", "create", "make", "draw", "render", "design", "produce"]
-    
-    if has_visual_noun:
-        # Only consider it an image request if there's BOTH a verb AND a visual noun
-        has_verb = any(verb in lowered for verb in generation_verbs)
-        if has_verb:
-            logger.info(f"🎨 Detected image request (verb + visual noun): {trimmed[:50]}...")
-            return trimmed
-    
-    # 5. Special case: "draw" at the start is usually for images
+    # 2. Check for explicit "image of..." patterns (highest confidence)
+    if _EXPLICIT_PATTERN_RE.search(lowered):
+        logger.info(f"🎨 Detected image request (explicit pattern): {trimmed[:50]}...")
+        return trimmed
+
+    # 3. Check for "generate/create/make/draw" + explicit visual noun
+    # Only an image request if there's BOTH a verb AND a visual noun, so
+    # "create a spreadsheet" is not treated as image generation
+    if _VISUAL_NOUN_RE.search(lowered) and _GENERATION_VERB_RE.search(lowered):
+        logger.info(f"🎨 Detected image request (verb + visual noun): {trimmed[:50]}...")
+        return trimmed
+
+    # 4. Special case: "draw" at the start is usually for images
     if lowered.startswith("draw "):
         logger.info(f"🎨 Detected image request (starts with 'draw'): {trimmed[:50]}...")
         return trimmed
-    
-    # 6. Special case: "show me a picture/image" patterns
-    show_patterns = ["show me a picture", "show me an image", "show me a photo"]
-    if any(pattern in lowered for pattern in show_patterns):
+
+    # 5. Special case: "show me a picture/image" patterns
+    if _SHOW_PATTERN_RE.search(lowered):
         logger.info(f"🎨 Detected image request (show me pattern): {trimmed[:50]}...")
         return trimmed
 
@@ -292,7 +333,7 @@ async def process_message(msg: dict) -> str:
     chat_id = msg.get("from") or msg.get("from_") or ""
     
     # Get user-specific kernel (per-user session isolation)
-    user_kernel = get_kernel_for_user(chat_id)
+    user_kernel = await get_kernel_for_user(chat_id)
 
     # Detect if body is actually base64 image data (thumbnail) instead of text
     # JPEG base64 starts with /9j/, PNG base64 starts with iVBOR
@@ -383,7 +424,7 @@ Images (JPG, PNG, WebP), PDF, DOCX, TXT"""
 
             # Handle /connect list - show all available toolkits
             if app_name == "list" or app_name == "all":
-                all_apps_list = user_kernel.list_toolkits(limit=100)
+                all_apps_list = await run_for_user(chat_id, user_kernel.list_toolkits, limit=100)
                 if not all_apps_list:
                     return "❌ Could not fetch toolkits. Check COMPOSIO_API_KEY and try again."
                 display_list = ", ".join(all_apps_list[:50])
@@ -412,9 +453,9 @@ Example: /connect shopify
 
             try:
                 # Check if already connected
-                if user_kernel.check_connection(app_name):
+                if await run_for_user(chat_id, user_kernel.check_connection, app_name):
                     # Add the app to active toolkits if not already there
-                    user_kernel.add_apps([app_name])
+                    await run_for_user(chat_id, user_kernel.add_apps, [app_name])
                     current_apps = user_kernel.active_toolkits
                     app_display = app_name.upper()
                     
@@ -432,15 +473,15 @@ Try asking me:
 💡 Use /tools to see all connected tools"""
                 
                 # Generate auth Link (only if not connected)
-                auth_url = user_kernel.get_auth_url(app_name)
+                auth_url = await run_for_user(chat_id, user_kernel.get_auth_url, app_name)
                 
                 # If auth_url is None, it means already connected (shouldn't happen due to check above, but just in case)
                 if auth_url is None:
-                    user_kernel.add_apps([app_name])
+                    await run_for_user(chat_id, user_kernel.add_apps, [app_name])
                     return f"✅ {app_name.upper()} is already connected! Try asking me about your {app_name} data."
                 
                 # Add the app to the kernel
-                user_kernel.add_apps([app_name])
+                await run_for_user(chat_id, user_kernel.add_apps, [app_name])
                 
                 current_apps = user_kernel.active_toolkits
                 app_display = app_name.upper()
@@ -460,7 +501,7 @@ Once authorized, you can use natural language like:
                 logger.error(f"Failed to connect {app_name}: {e}")
                 # Try to provide auth link even on failure
                 try:
-                    auth_url = user_kernel.get_auth_url(app_name, force=True)
+                    auth_url = await run_for_user(chat_id, user_kernel.get_auth_url, app_name, force=True)
                     if auth_url is None:
                         return f"✅ {app_name.upper()} is already connected!"
                     return f"""⚠️ *Authorization Needed*
@@ -497,7 +538,7 @@ Example: /status gmail
 This will check if you have an active connection to the specified app."""
             
             try:
-                is_connected = user_kernel.check_connection(app_name)
+                is_connected = await run_for_user(chat_id, user_kernel.check_connection, app_name)
                 app_display = app_name.upper()
                 
                 if is_connected:
@@ -529,7 +570,7 @@ This will generate an authorization link for you."""
                 return "Usage: /image <prompt>\nExample: /image a futuristic city at sunset"
 
             logger.info(f"🎨 Image command detected. Prompt: {prompt}")
-            image_bytes = user_kernel.generate_image(prompt)
+            image_bytes = await run_for_user(chat_id, user_kernel.generate_image, prompt)
 
             if image_bytes:
                 logger.info(f"✅ Image generated! Size: {len(image_bytes)} bytes")
@@ -548,7 +589,7 @@ This will generate an authorization link for you."""
         if image_prompt is not None:
             prompt = image_prompt or msg_text
             logger.info(f"🎨 Natural image request detected. Prompt: {prompt}")
-            image_bytes = user_kernel.generate_image(prompt)
+            image_bytes = await run_for_user(chat_id, user_kernel.generate_image, prompt)
 
             if image_bytes:
                 logger.info(f"✅ Image generated! Size: {len(image_bytes)} bytes")
@@ -568,7 +609,7 @@ This will generate an authorization link for you."""
             if not speech_text:
                 return "Usage: /voice <text>\nExample: /voice Hello, how are you today?"
 
-            audio_bytes = user_kernel.generate_speech(speech_text)
+            audio_bytes = await run_for_user(chat_id, user_kernel.generate_speech, speech_text)
             if audio_bytes:
                 b64 = base64.b64encode(audio_bytes).decode("ascii")
                 await wpp_send_file(chat_id, b64, "voice.mp3", mimetype="audio/mpeg")
@@ -592,12 +633,12 @@ This will generate an authorization link for you."""
             # Voice note / audio
             if media_mimetype and media_mimetype.startswith("audio/"):
                 logger.info("🎙️ Processing audio/voice note...")
-                transcript = user_kernel.transcribe_audio(media_bytes)
+                transcript = await run_for_user(chat_id, user_kernel.transcribe_audio, media_bytes)
                 if not transcript:
                     return "I received your voice note but couldn't transcribe it. Please try again."
 
                 prompt = f"User {sender_name} sent a voice note. Transcript:\n{transcript}\n\nReply helpfully and concisely."
-                return user_kernel.run(prompt)
+                return await run_for_user(chat_id, user_kernel.run, prompt)
 
             # Image - use vision model
             if media_mimetype and media_mimetype.startswith("image/"):
@@ -629,8 +670,8 @@ This will generate an authorization link for you."""
                     try:
                         # First, analyze the image to understand what's in it
                         analysis_prompt = "Describe this product in detail: its type, color, style, material, and key features. Be specific and brief."
-                        product_description = user_kernel.run_with_vision(
-                            media_bytes, analysis_prompt
+                        product_description = await run_for_user(
+                            chat_id, user_kernel.run_with_vision, media_bytes, analysis_prompt
                         )
                         logger.info(
                             f"🎨 Product analysis: {product_description[:100]}..."
@@ -645,7 +686,7 @@ Style: Premium e-commerce product photography, clean white or gradient backgroun
                         logger.info(
                             f"🎨 Generating image with prompt: {gen_prompt[:100]}..."
                         )
-                        image_bytes = user_kernel.generate_image(gen_prompt)
+                        image_bytes = await run_for_user(chat_id, user_kernel.generate_image, gen_prompt)
 
                         if image_bytes:
                             logger.info(
@@ -739,7 +780,7 @@ Be thorough but present it in a digestible format."""
                     prompt = f"User {sender_name} sent an image. {caption}Describe what you see and respond helpfully."
 
                 logger.info(f"🖼️ Vision prompt: {prompt[:100]}...")
-                result = user_kernel.run_with_vision(media_bytes, prompt)
+                result = await run_for_user(chat_id, user_kernel.run_with_vision, media_bytes, prompt)
                 result = strip_markdown(result)
                 logger.info(f"🖼️ Vision result: {result[:200] if result else 'None'}...")
                 return result
@@ -763,7 +804,7 @@ Be thorough but present it in a digestible format."""
                     prompt = f"Extract and analyze ALL text from this image. The user sent this as a document named '{filename}'."
                     if msg_text:
                         prompt += f"\n\nUser request: {msg_text}"
-                    return user_kernel.run_with_vision(media_bytes, prompt)
+                    return await run_for_user(chat_id, user_kernel.run_with_vision, media_bytes, prompt)
 
                 # For PDFs - use OpenRouter's file-parser plugin (AI-powered)
                 if media_mimetype == "application/pdf" or filename.lower().endswith(
@@ -773,7 +814,7 @@ Be thorough but present it in a digestible format."""
                     prompt = (
                         f"Analyze this PDF document named '{filename}'. {user_request}"
                     )
-                    result = user_kernel.run_with_pdf(media_bytes, prompt, filename)
+                    result = await run_for_user(chat_id, user_kernel.run_with_pdf, media_bytes, prompt, filename)
                     if result and not result.startswith("PDF analysis error"):
                         return result
                     # Fall back to local extraction if AI fails
@@ -782,8 +823,11 @@ Be thorough but present it in a digestible format."""
                     )
 
                 # For DOCX, TXT, etc. - use local extraction + AI analysis
-                extracted = user_kernel.extract_document_text(
-                    media_bytes, filename=filename, mime_type=media_mimetype
+                extracted = await run_for_user(
+                    chat_id, user_kernel.extract_document_text,
+                    media_bytes,
+                    filename=filename,
+                    mime_type=media_mimetype,
                 )
                 logger.info(
                     f"📄 Extracted {len(extracted) if extracted else 0} chars from document"
@@ -791,7 +835,7 @@ Be thorough but present it in a digestible format."""
 
                 if extracted:
                     prompt = f"User {sender_name} sent a document named '{filename}'.\n\nDocument content:\n{extracted[:6000]}\n\nRequest: {user_request}\n\nProvide a helpful response."
-                    return user_kernel.run(prompt)
+                    return await run_for_user(chat_id, user_kernel.run, prompt)
 
                 return "I received the document but couldn't read its contents. Supported formats: PDF, DOCX, TXT, images."
 
@@ -799,6 +843,9 @@ Be thorough but present it in a digestible format."""
         if not msg_text:
             return ""
 
+        # Identical text from the same chat while a reply is pending shares it
+        run_key = (chat_id, " ".join(msg_text.split()).lower())
+
         # 🎯 PROACTIVE MODE: Detect friction and act autonomously
         from proactive_agent import FrictionDetector
         
@@ -806,14 +853,14 @@ Be thorough but present it in a digestible format."""
         
         if friction['has_friction']:
             logger.info(f"🎯 Friction detected: {[fp['keyword'] for fp in friction['friction_points']]}")
-            logger.info(f"   Categories: {list(set([fp['category'] for fp in friction['friction_points']]))}")
+            logger.info(f"   Categories: {list({fp['category'] for fp in friction['friction_points']})}")
             
             # Execute proactive workflow - agent will build solution autonomously
-            result = user_kernel.run_proactive(friction)
+            result = await run_coalesced(run_key, user_kernel.run_proactive, friction)
             return strip_markdown(result)
         
         # Run through the AI agent (normal mode)
-        result = user_kernel.run(msg_text)
+        result = await run_coalesced(run_key, user_kernel.run, msg_text)
         return strip_markdown(result)
 
     finally:
@@ -826,7 +873,9 @@ async def check_important_emails():
     """Uses the Kernel to check emails."""
     logger.info("🕵️ Checking Inbox via Kernel...")
     try:
-        response = agent_kernel.run(
+        response = await run_for_user(
+            DEFAULT_KERNEL_KEY,
+            agent_kernel.run,
             "Find unread emails from the last 60 minutes. "
             "Return a summary of any that seem urgent or involve 'meetings', 'contracts', or 'VIPs'. "
             "If none, reply 'No urgent emails'."
@@ -870,18 +919,29 @@ async def lifespan(app: FastAPI):
     # Initialize HTTP client
     http_client = httpx.AsyncClient()
 
-    # Wait for WPP Bridge to be ready
+    # Wait for WPP Bridge to be ready, backing off exponentially (with jitter)
+    # so a bridge that is already up is picked up almost immediately
     logger.info(f"🔌 Connecting to WPP Bridge at {WPP_BRIDGE_URL}...")
-    for i in range(30):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + WPP_BRIDGE_WAIT_SECONDS
+    backoff = WPP_BRIDGE_MIN_BACKOFF
+    attempt = 0
+    while True:
+        attempt += 1
         try:
             status = await wpp_get_status()
             if status.get("ready"):
                 logger.info("✅ WPP Bridge connected!")
                 break
-            logger.info(f"⏳ Waiting for WPP Bridge... ({i + 1}/30)")
+            logger.info(f"⏳ Waiting for WPP Bridge... (attempt {attempt})")
         except:
             pass
-        await asyncio.sleep(2)
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            logger.warning("⚠️ WPP Bridge not ready yet - continuing startup")
+            break
+        await asyncio.sleep(min(backoff + random.random() * 0.25, remaining))
+        backoff = min(backoff * 2, WPP_BRIDGE_MAX_BACKOFF)
 
     # Start scheduler if enabled
     if ENABLE_SCHEDULER:
@@ -934,20 +994,23 @@ async def whatsapp_incoming(request: Request):
     Callback endpoint for incoming WhatsApp messages.
     The WPP Bridge forwards messages here.
     """
-    global processed_messages
-
     try:
         data = await request.json()
         msg_id = data.get("id", "")
 
-        # Deduplicate
-        if msg_id in processed_messages:
+        # Deduplicate by WhatsApp id, then by content for re-deliveries
+        # that show up under a fresh id after a reconnect
+        if not mark_processed(msg_id):
+            return {"reply": None}
+        msg_content_key = content_key(data)
+        if msg_content_key and not mark_processed(msg_content_key):
+            logger.info(f"⏭️ Skipping re-delivered message {msg_id}")
             return {"reply": None}
-        processed_messages.add(msg_id)
 
-        # Keep set manageable
-        if len(processed_messages) > 1000:
-            processed_messages = set(list(processed_messages)[-500:])
+        # Skip system rows before starting typing indicators or LLM work
+        if data.get("type") in NON_REPLYABLE_TYPES:
+            logger.info(f"⏭️ Skipping {data.get('type')} message {msg_id}")
+            return {"reply": None}
 
         # Handle 'from' field aliasing
         if "from" in data:
@@ -992,7 +1055,7 @@ async def whatsapp_send_image(request: SendImageRequest):
 async def connect_app(app_name: str):
     """Generate OAuth URL to connect a Composio app."""
     try:
-        url = agent_kernel.get_auth_url(app_name)
+        url = await run_for_user(DEFAULT_KERNEL_KEY, agent_kernel.get_auth_url, app_name)
         return {"url": url, "app": app_name}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1002,7 +1065,7 @@ async def connect_app(app_name: str):
 async def add_app(app_name: str):
     """Add a Composio app to the agent."""
     try:
-        agent_kernel.add_apps([app_name])
+        await run_for_user(DEFAULT_KERNEL_KEY, agent_kernel.add_apps, [app_name])
         return {"status": "added", "app": app_name}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
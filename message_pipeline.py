@@ -0,0 +1,196 @@
+"""
+Message delivery helpers for PocketAgent.
+
+- Dedup of WhatsApp re-deliveries (by message id and by content)
+- A get-or-create LRU for per-user kernels
+- Running blocking kernel calls off the event loop, one call per chat at a
+  time, with identical in-flight requests sharing a single call
+
+Kept free of FastAPI and kernel imports so the delivery logic can be tested
+on its own.
+"""
+
+import asyncio
+import functools
+import hashlib
+import logging
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger("PocketAgent")
+
+MAX_PROCESSED_MESSAGES = 10_000
+
+# Message tracking (insertion-ordered, oldest evicted first)
+processed_messages: "OrderedDict[str, None]" = OrderedDict()
+
+# In-flight text runs keyed by (chat_id, normalized text), so identical
+# concurrent requests share one kernel call
+inflight_runs: dict[tuple[str, str], asyncio.Future] = {}
+
+# One lock per chat. Kernel calls run in worker threads, so this is what keeps
+# a chat's kernel from being built twice or used by two calls at once (e.g.
+# /connect rebuilding the agent via add_apps while run() is using it). Weak
+# values let a chat's lock go away once no request is holding it.
+_user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def mark_processed(msg_id: str) -> bool:
+    """Record a message id. Returns False if it was already processed."""
+    if msg_id in processed_messages:
+        processed_messages.move_to_end(msg_id)
+        return False
+    processed_messages[msg_id] = None
+    if len(processed_messages) > MAX_PROCESSED_MESSAGES:
+        processed_messages.popitem(last=False)
+    return True
+
+
+def content_key(msg: dict) -> Optional[str]:
+    """Build a content dedup key for re-deliveries that arrive under a new id.
+
+    Hashes sender, timestamp, body and the head of any media payload with
+    BLAKE2b (64-bit digest). Returns None when the message has no timestamp,
+    since identical short texts ("ok") would otherwise collide.
+    """
+    timestamp = msg.get("timestamp")
+    if timestamp is None:
+        return None
+    sender = msg.get("from") or msg.get("from_") or ""
+    media_head = (msg.get("mediaBase64") or "")[:4096]
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(f"{sender}|{timestamp}|{msg.get('body') or ''}|".encode())
+    digest.update(media_head.encode())
+    return f"content:{digest.hexdigest()}"
+
+
+def user_lock(user_id: str) -> asyncio.Lock:
+    """Return the lock serializing kernel work for one chat."""
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    return lock
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking kernel call in the default thread pool.
+
+    Kernel methods make synchronous LLM/Composio HTTP calls; awaiting them
+    here keeps the event loop free to serve other incoming messages.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+def _hold_until_done(lock: asyncio.Lock, call: asyncio.Future) -> None:
+    """Release lock once call's worker thread finishes, not when its caller gives up."""
+    def _release(done: asyncio.Future) -> None:
+        if not done.cancelled():
+            done.exception()  # Mark retrieved if nobody is left awaiting it
+        lock.release()
+
+    call.add_done_callback(_release)
+
+
+async def run_for_user(user_id: str, func, *args, **kwargs):
+    """run_blocking for a call on a user's kernel, one call per chat at a time.
+
+    A worker thread can't be interrupted, so the chat stays locked until the
+    call actually finishes, even if the awaiting request is cancelled first.
+    """
+    lock = user_lock(user_id)
+    await lock.acquire()
+    try:
+        call = asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(func, *args, **kwargs)
+        )
+    except BaseException:
+        lock.release()
+        raise
+    _hold_until_done(lock, call)
+    return await asyncio.shield(call)
+
+
+async def get_or_create(
+    cache: "OrderedDict[str, Any]",
+    user_id: str,
+    factory: Callable[[str], Any],
+    max_size: int,
+) -> Any:
+    """Return cache[user_id], building it with factory(user_id) on a miss.
+
+    The cache is an LRU: hits move to the end, and the least recently used
+    entry is evicted once it grows past max_size. factory runs in a worker
+    thread under the chat's lock, so concurrent first messages build it once,
+    and nothing is cached if it raises. Like run_for_user, the lock is held
+    until the build finishes, and the result is cached even if the request
+    that started it was cancelled.
+    """
+    value = cache.get(user_id)
+    if value is not None:
+        cache.move_to_end(user_id)
+        return value
+
+    lock = user_lock(user_id)
+    await lock.acquire()
+    try:
+        # Another message from this chat may have built it while we waited
+        value = cache.get(user_id)
+        if value is None:
+            logger.info(f"🔧 Creating new kernel for user: {user_id}")
+            build = asyncio.get_running_loop().run_in_executor(None, factory, user_id)
+    except BaseException:
+        lock.release()
+        raise
+    if value is not None:
+        cache.move_to_end(user_id)
+        lock.release()
+        return value
+
+    def _store(done: asyncio.Future) -> None:
+        if done.cancelled() or done.exception() is not None:
+            return
+        cache[user_id] = done.result()
+        if len(cache) > max_size:
+            evicted_id, _ = cache.popitem(last=False)
+            logger.info(f"♻️ Evicted idle kernel for user: {evicted_id}")
+
+    # Callbacks run in order, so the kernel is cached before the lock frees
+    build.add_done_callback(_store)
+    _hold_until_done(lock, build)
+    return await asyncio.shield(build)
+
+
+async def run_coalesced(key: tuple[str, str], func, *args):
+    """Run a blocking kernel call, sharing its result with identical in-flight calls.
+
+    A re-sent message arriving while the first copy is still being answered
+    awaits the pending result instead of issuing a second LLM call.
+    """
+    while (pending := inflight_runs.get(key)) is not None:
+        logger.info(f"🔁 Joining in-flight request for {key[0]}")
+        # wait() only raises if this task is cancelled, and never cancels
+        # pending itself, so no Task.cancelling() (3.11+) check is needed
+        await asyncio.wait({pending})
+        if not pending.cancelled():
+            return pending.result()
+        # The first request was cancelled, so its result will never come;
+        # answer this message ourselves
+        logger.info(f"🔁 In-flight request for {key[0]} was cancelled, running it again")
+
+    future = asyncio.get_running_loop().create_future()
+    inflight_runs[key] = future
+    try:
+        result = await run_for_user(key[0], func, *args)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Mark retrieved; the caller re-raises below
+        raise
+    finally:
+        if not future.done():
+            future.cancel()
+        if inflight_runs.get(key) is future:
+            del inflight_runs[key]
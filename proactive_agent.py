@@ -9,10 +9,82 @@ Implements the Moltbook philosophy:
 """
 
 import logging
+import re
+from string import Template
 from typing import Dict, List, Optional
 
 logger = logging.getLogger("ProactiveAgent")
 
+# Static prompt text is built once at import; only the per-message fields
+# of the proactive prompt are substituted at call time.
+PROACTIVE_PROMPT_TEMPLATE = Template("""🎯 PROACTIVE MODE ACTIVATED
+
+USER MESSAGE: "$user_message"
+
+FRICTION DETECTED:
+- Keywords: $keywords
+- Categories: $categories
+
+YOUR TASK: BUILD A SOLUTION IMMEDIATELY. Don't ask permission.
+
+INSTRUCTIONS:
+1. Analyze what the user needs based on their complaint/friction
+2. Use your available tools to build a working solution
+3. Present the solution with what you built
+4. Explain how it solves their problem
+
+AVAILABLE TOOLS: $tools_list
+
+REMEMBER:
+✅ ACT, don't ask
+✅ BUILD, don't suggest
+✅ SHOW working solutions, not ideas
+✅ Use tools to actually DO things
+
+Example approach:
+- If they mention "checking emails manually" → Use Gmail tools to fetch and summarize
+- If they mention "repetitive task" → Build automation using available tools
+- If they mention "always forget" → Create reminder/tracking system
+
+START BUILDING NOW.""")
+
+PROACTIVE_SYSTEM_PROMPT = """You are a PROACTIVE AI assistant that DOES things, not just talks about them.
+
+🎯 CORE BEHAVIOR: When you detect friction or problems, BUILD SOLUTIONS IMMEDIATELY.
+
+PATTERN TO FOLLOW:
+1. Notice friction (complaints, problems, tedious tasks mentioned)
+2. Build solution (use your tools to actually solve it)
+3. Present working solution (show what you built)
+4. Iterate based on feedback
+
+DO NOT:
+❌ Ask "Would you like me to help with that?"
+❌ Ask "Should I automate this for you?"
+❌ Wait for explicit permission
+❌ Just provide suggestions
+
+DO:
+✅ Detect problems from casual conversation
+✅ Immediately use tools to build solutions
+✅ Present working implementations
+✅ Take initiative
+
+EXAMPLES:
+User: "Ugh, I always have to manually check my emails for invoices"
+You: *Immediately use Gmail tools to search for invoices and create a summary*
+"I found 5 invoices in your inbox. Here's the summary: [details]. I can set up automatic invoice tracking if you'd like."
+
+User: "It's annoying to check my tasks every morning"
+You: *Immediately use Asana/task tools to fetch and summarize tasks*
+"Here are your 7 tasks for today: [list with priorities]. I pulled this from your Asana. Want me to send you this summary every morning?"
+
+User: "I keep forgetting to follow up on emails"
+You: *Use Gmail tools to find emails needing follow-up*
+"I found 3 emails from the past week that need follow-up: [list]. I can track these and remind you if you'd like."
+
+REMEMBER: You're not a chatbot, you're an AUTONOMOUS AGENT that ACTS."""
+
 
 class FrictionDetector:
     """Detects friction points in user messages that indicate problems to solve."""
@@ -43,6 +115,10 @@ class FrictionDetector:
         'always forget': 'forgetfulness',
     }
     
+    # One alternation over every keyword: messages without friction (the
+    # common case) are rejected in a single scan instead of one per keyword
+    _FRICTION_PATTERN = re.compile('|'.join(re.escape(k) for k in FRICTION_KEYWORDS))
+    
     @classmethod
     def detect(cls, message: str) -> Dict:
         """
@@ -57,6 +133,9 @@ class FrictionDetector:
         message_lower = message.lower()
         detected = []
         
+        if not cls._FRICTION_PATTERN.search(message_lower):
+            return {'has_friction': False, 'friction_points': [], 'context': message}
+        
         for keyword, category in cls.FRICTION_KEYWORDS.items():
             if keyword in message_lower:
                 detected.append({
@@ -90,44 +169,21 @@ class ProactivePromptBuilder:
         friction_points = friction_context.get('friction_points', [])
         user_message = friction_context.get('context', '')
         
-        # Extract friction categories
-        categories = list(set([fp['category'] for fp in friction_points]))
-        keywords = [fp['keyword'] for fp in friction_points]
+        # Collect keywords and unique categories (first-seen order) in one pass
+        keywords = []
+        categories = {}
+        for fp in friction_points:
+            keywords.append(fp['keyword'])
+            categories[fp['category']] = None
         
         tools_list = ', '.join(available_tools) if available_tools else 'none'
         
-        prompt = f"""🎯 PROACTIVE MODE ACTIVATED
-
-USER MESSAGE: "{user_message}"
-
-FRICTION DETECTED:
-- Keywords: {', '.join(keywords)}
-- Categories: {', '.join(categories)}
-
-YOUR TASK: BUILD A SOLUTION IMMEDIATELY. Don't ask permission.
-
-INSTRUCTIONS:
-1. Analyze what the user needs based on their complaint/friction
-2. Use your available tools to build a working solution
-3. Present the solution with what you built
-4. Explain how it solves their problem
-
-AVAILABLE TOOLS: {tools_list}
-
-REMEMBER:
-✅ ACT, don't ask
-✅ BUILD, don't suggest
-✅ SHOW working solutions, not ideas
-✅ Use tools to actually DO things
-
-Example approach:
-- If they mention "checking emails manually" → Use Gmail tools to fetch and summarize
-- If they mention "repetitive task" → Build automation using available tools
-- If they mention "always forget" → Create reminder/tracking system
-
-START BUILDING NOW."""
-        
-        return prompt
+        return PROACTIVE_PROMPT_TEMPLATE.substitute(
+            user_message=user_message,
+            keywords=', '.join(keywords),
+            categories=', '.join(categories),
+            tools_list=tools_list,
+        )
     
     @staticmethod
     def build_proactive_system_prompt() -> str:
@@ -137,42 +193,7 @@ START BUILDING NOW."""
         Returns:
             System prompt string
         """
-        return """You are a PROACTIVE AI assistant that DOES things, not just talks about them.
-
-🎯 CORE BEHAVIOR: When you detect friction or problems, BUILD SOLUTIONS IMMEDIATELY.
-
-PATTERN TO FOLLOW:
-1. Notice friction (complaints, problems, tedious tasks mentioned)
-2. Build solution (use your tools to actually solve it)
-3. Present working solution (show what you built)
-4. Iterate based on feedback
-
-DO NOT:
-❌ Ask "Would you like me to help with that?"
-❌ Ask "Should I automate this for you?"
-❌ Wait for explicit permission
-❌ Just provide suggestions
-
-DO:
-✅ Detect problems from casual conversation
-✅ Immediately use tools to build solutions
-✅ Present working implementations
-✅ Take initiative
-
-EXAMPLES:
-User: "Ugh, I always have to manually check my emails for invoices"
-You: *Immediately use Gmail tools to search for invoices and create a summary*
-"I found 5 invoices in your inbox. Here's the summary: [details]. I can set up automatic invoice tracking if you'd like."
-
-User: "It's annoying to check my tasks every morning"
-You: *Immediately use Asana/task tools to fetch and summarize tasks*
-"Here are your 7 tasks for today: [list with priorities]. I pulled this from your Asana. Want me to send you this summary every morning?"
-
-User: "I keep forgetting to follow up on emails"
-You: *Use Gmail tools to find emails needing follow-up*
-"I found 3 emails from the past week that need follow-up: [list]. I can track these and remind you if you'd like."
-
-REMEMBER: You're not a chatbot, you're an AUTONOMOUS AGENT that ACTS."""
+        return PROACTIVE_SYSTEM_PROMPT
 
 
 def should_use_proactive_mode(message: str) -> bool:
@@ -0,0 +1,154 @@
+"""
+Shared Composio helpers for the diagnostic scripts.
+
+Keeps one Composio client per process and caches connected_accounts.list()
+results on disk for a short TTL, so repeated debug runs don't hit the API.
+Set COMPOSIO_CACHE_TTL=0 to always fetch fresh data. Cached listings can hold
+account state, so the cache is private to the current user (0600 files, in
+a 0700 directory when created here) and files owned by anyone else are never
+unpickled.
+
+API calls made through @ratelimited share a concurrency cap
+(COMPOSIO_MAX_CONCURRENCY) and back off with jitter when Composio answers 429.
+"""
+
+import functools
+import hashlib
+import os
+import pickle
+import random
+import stat
+import sys
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COMPOSIO_API_KEY = os.environ.get("COMPOSIO_API_KEY")
+# Cache entries are scoped to the API key so accounts never mix
+_API_KEY_HASH = hashlib.sha256((COMPOSIO_API_KEY or "").encode()).hexdigest()
+
+CACHE_DIR = Path(os.environ.get("COMPOSIO_CACHE_DIR", Path.home() / ".cache" / "ai-employee"))
+DEFAULT_TTL = int(os.environ.get("COMPOSIO_CACHE_TTL", 600))
+MAX_CONCURRENT_CALLS = int(os.environ.get("COMPOSIO_MAX_CONCURRENCY", 10))
+MAX_RETRIES = 5
+
+_call_sem = threading.BoundedSemaphore(MAX_CONCURRENT_CALLS)
+
+_client = None
+
+
+def get_client():
+    """Return the process-wide Composio client, creating it on first use."""
+    global _client
+    if _client is None:
+        from composio import Composio
+        _client = Composio(api_key=COMPOSIO_API_KEY)
+    return _client
+
+
+def _is_rate_limited(exc: Exception) -> bool:
+    """True if the SDK error is an HTTP 429 (the SDK has no dedicated type)."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429
+    # Errors without a status only count on the exact reason phrase; ids
+    # and other numbers in messages can contain "429" too
+    return "too many requests" in str(exc).lower()
+
+
+def ratelimited(fn):
+    """Cap concurrent Composio calls and retry 429s with exponential backoff."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(MAX_RETRIES):
+            try:
+                with _call_sem:
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == MAX_RETRIES - 1 or not _is_rate_limited(e):
+                    raise
+            # Sleep outside the semaphore so other callers can proceed
+            time.sleep(min(60, 2 ** attempt) + random.random())
+    return wrapper
+
+
+@ratelimited
+def _fetch_connections(**kwargs):
+    return get_client().connected_accounts.list(**kwargs)
+
+
+def _cache_path(call: str, *key_parts) -> Path:
+    """Cache file for a call, scoped to the API key."""
+    raw = "|".join([_API_KEY_HASH, call, *(repr(part) for part in key_parts)])
+    return CACHE_DIR / f"{call}_{hashlib.sha1(raw.encode()).hexdigest()}.pkl"
+
+
+def _is_private(st: os.stat_result) -> bool:
+    """True if the file belongs to us and nobody else can write it."""
+    getuid = getattr(os, "getuid", None)  # not available on Windows
+    if getuid is not None and st.st_uid != getuid():
+        return False
+    return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _read_cache(path: Path, ttl: int):
+    """Return (object, age in seconds) if a private cache entry is younger than ttl.
+
+    Returns (None, None) on a miss, an expired entry, or a file we don't own.
+    """
+    if ttl <= 0:
+        return None, None
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+    except OSError:
+        return None, None
+    with os.fdopen(fd, "rb") as f:
+        st = os.fstat(f.fileno())
+        age = time.time() - st.st_mtime
+        if age >= ttl or not _is_private(st):
+            return None, None
+        try:
+            return pickle.load(f), age
+        except Exception:
+            return None, None
+
+
+def _write_cache(path: Path, value) -> None:
+    """Atomically store value; unpicklable SDK responses are simply not cached."""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        # Only a directory created here is made 0700; an existing one (e.g. a
+        # COMPOSIO_CACHE_DIR pointing at the project) keeps its permissions,
+        # since the entries themselves are 0600 anyway
+        CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_NOFOLLOW", 0)
+        with os.fdopen(os.open(tmp_path, flags, 0o600), "wb") as f:
+            pickle.dump(value, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def list_connections(user_ids=None, ttl: int = DEFAULT_TTL):
+    """Cached connected_accounts.list(), optionally filtered by user ids."""
+    user_ids = sorted(user_ids) if user_ids else []
+    path = _cache_path("connected_accounts", user_ids)
+
+    cached, age = _read_cache(path, ttl)
+    if cached is not None:
+        print(f"(cached {age:.0f}s ago; set COMPOSIO_CACHE_TTL=0 for live data)", file=sys.stderr)
+        return cached
+
+    kwargs = {"user_ids": user_ids} if user_ids else {}
+    response = _fetch_connections(**kwargs)
+    _write_cache(path, response)
+    return response
@@ -2,35 +2,62 @@
 Check all connections for a user to see what's actually connected
 """
 
+import argparse
 import os
 from dotenv import load_dotenv
-from kernel import AgentKernel
 
 load_dotenv()
 
-def check_all_connections():
-    """Check all connections for the user."""
-    print("\n" + "=" * 70)
+BAR = "=" * 70
+
+
+def _normalize(name):
+    return str(name).lower().replace(" ", "").replace("_", "")
+
+
+def _matches_toolkit(toolkit, toolkit_filter):
+    """True if a session toolkit is the one given to --toolkit (slug or display name)."""
+    wanted = _normalize(toolkit_filter)
+    return any(
+        _normalize(value) == wanted
+        for value in (getattr(toolkit, 'slug', None), getattr(toolkit, 'name', None))
+        if value
+    )
+
+
+def check_all_connections(toolkit_filter=None):
+    """Check all connections for the user, optionally for a single toolkit."""
+    print("\n" + BAR)
     print("🔍 CHECKING ALL CONNECTIONS")
-    print("=" * 70)
+    print(BAR)
     
     user_id = "+254708235245@c.us"
     print(f"\n👤 User: {user_id}")
+    if toolkit_filter:
+        print(f"🧰 Toolkit: {toolkit_filter}")
+    
+    # Imported here so --help doesn't pay for loading LangChain and Composio
+    from kernel import AgentKernel
+    from _composio_cache import ratelimited
     
     # Create kernel
     kernel = AgentKernel(user_id=user_id)
-    kernel.setup()
+    # Loading tools for every connected app is the slowest step; with a
+    # filter, only load the one toolkit being checked
+    kernel.setup(apps=[toolkit_filter] if toolkit_filter else None)
     
     print("\n1️⃣ Checking via session.toolkits()...")
     try:
-        toolkits = kernel.composio_session.toolkits()
+        toolkits = kernel.composio_session.toolkits().items
+        if toolkit_filter:
+            toolkits = [t for t in toolkits if _matches_toolkit(t, toolkit_filter)]
         
-        if not toolkits.items:
+        if not toolkits:
             print("   ❌ No toolkits found")
         else:
-            print(f"   ✅ Found {len(toolkits.items)} toolkit(s):")
+            print(f"   ✅ Found {len(toolkits)} toolkit(s):")
             
-            for i, toolkit in enumerate(toolkits.items, 1):
+            for i, toolkit in enumerate(toolkits, 1):
                 print(f"\n   📦 Toolkit #{i}:")
                 print(f"      • Name: {toolkit.name}")
                 
@@ -51,9 +78,12 @@ def check_all_connections():
         traceback.print_exc()
     
     print("\n2️⃣ Checking via connected_accounts.list()...")
+    connected_accounts = None
     try:
-        connected_accounts = kernel.composio_client.connected_accounts.list(
-            user_ids=[user_id]
+        # Let the server filter by toolkit rather than fetching every account
+        kwargs = {"toolkit_slugs": [toolkit_filter]} if toolkit_filter else {}
+        connected_accounts = ratelimited(kernel.composio_client.connected_accounts.list)(
+            user_ids=[user_id], **kwargs
         )
         
         if not connected_accounts.items:
@@ -61,18 +91,23 @@ def check_all_connections():
         else:
             print(f"   ✅ Found {len(connected_accounts.items)} account(s):")
             
+            # All accounts share one pydantic model, so decide which optional
+            # app fields exist once from its schema instead of per account
+            first = connected_accounts.items[0]
+            model_fields = getattr(type(first), 'model_fields', None)
+            app_fields = [
+                (attr, label)
+                for attr, label in (('app', 'App'), ('appName', 'App Name'), ('integration', 'Integration'))
+                if (attr in model_fields if model_fields is not None else hasattr(first, attr))
+            ]
+            
             for i, account in enumerate(connected_accounts.items, 1):
                 print(f"\n   🔗 Account #{i}:")
                 print(f"      • ID: {account.id}")
                 print(f"      • Status: {account.status}")
                 
-                # Try to get app name
-                if hasattr(account, 'app'):
-                    print(f"      • App: {account.app}")
-                if hasattr(account, 'appName'):
-                    print(f"      • App Name: {account.appName}")
-                if hasattr(account, 'integration'):
-                    print(f"      • Integration: {account.integration}")
+                for attr, label in app_fields:
+                    print(f"      • {label}: {getattr(account, attr)}")
                 
     except Exception as e:
         print(f"   ❌ Error: {e}")
@@ -80,20 +115,33 @@ def check_all_connections():
         traceback.print_exc()
     
     print("\n3️⃣ Testing specific apps...")
-    test_apps = ["asana", "gmail", "googlecalendar", "slack", "github"]
+    test_apps = [toolkit_filter] if toolkit_filter else ["asana", "gmail", "googlecalendar", "slack", "github"]
     
-    for app in test_apps:
-        is_connected = kernel.check_connection(app)
-        status = "✅ Connected" if is_connected else "❌ Not Connected"
-        print(f"   {status}: {app}")
+    if connected_accounts is None:
+        print("   ⚠️ Skipped: the account listing above failed")
+    else:
+        # kernel.check_connection would list the same accounts once per app,
+        # so match the apps against the listing section 2 already fetched
+        active_slugs = {
+            _normalize(getattr(account.toolkit, 'slug', ''))
+            for account in connected_accounts.items
+            if account.status == "ACTIVE" and getattr(account, 'toolkit', None)
+        }
+        for app in test_apps:
+            status = "✅ Connected" if _normalize(app) in active_slugs else "❌ Not Connected"
+            print(f"   {status}: {app}")
     
-    print("\n" + "=" * 70)
+    print("\n" + BAR)
     print("✅ Connection check complete!")
-    print("=" * 70)
+    print(BAR)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--toolkit", default=None, help="only check this toolkit slug (e.g. googledocs)")
+    args = parser.parse_args()
+    
     try:
-        check_all_connections()
+        check_all_connections(toolkit_filter=args.toolkit)
     except Exception as e:
         print(f"\n❌ Failed: {e}")
         import traceback
@@ -1,18 +1,21 @@
-from composio import Composio
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-client = Composio(api_key=os.getenv("COMPOSIO_API_KEY"))
+from _composio_cache import list_connections
 
 try:
-    response = client.connected_accounts.list()
+    response = list_connections()
     if hasattr(response, 'items'):
         for item in response.items:
             print(f"--- Item ---")
-            print(f"Dir: {[x for x in dir(item) if not x.startswith('_')]}")
-            # Try to print everything
-            print(f"Dump: {item}")
+            # Pydantic models dump their validated fields in one walk; fall back
+            # to scanning public attributes for anything else
+            try:
+                payload = item.model_dump()
+            except AttributeError:
+                payload = {
+                    attr: getattr(item, attr)
+                    for attr in dir(item)
+                    if not attr.startswith('_') and not callable(getattr(item, attr, None))
+                }
+            for key, value in payload.items():
+                print(f"  • {key}: {value}")
 except Exception as e:
     print(e)
@@ -1,16 +1,19 @@
 """Generate Gmail connection URL"""
-import os
-from dotenv import load_dotenv
+import sys
 
-load_dotenv()
+from _composio_cache import COMPOSIO_API_KEY, get_client
 
-from composio import Composio
+BAR = "=" * 60
 
-print("=" * 60)
+print(BAR)
 print("GMAIL CONNECTION URL GENERATOR")
-print("=" * 60)
+print(BAR)
 
-composio = Composio(api_key=os.getenv("COMPOSIO_API_KEY"))
+# Bail out before get_client() pays for importing the Composio SDK
+if not COMPOSIO_API_KEY:
+    sys.exit("❌ COMPOSIO_API_KEY not set")
+
+composio = get_client()
 
 print("\nGenerating Gmail connection URL...\n")
 
@@ -22,11 +25,11 @@ try:
     )
     
     print("✅ Connection URL generated!\n")
-    print("=" * 60)
+    print(BAR)
     print("CLICK THIS LINK TO CONNECT GMAIL:")
-    print("=" * 60)
+    print(BAR)
     print(f"\n{connection_request.redirectUrl}\n")
-    print("=" * 60)
+    print(BAR)
     print("\nAfter connecting, run your agent again to check emails!")
     
 except Exception as e:
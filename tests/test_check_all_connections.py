@@ -0,0 +1,112 @@
+"""
+Test suite for scripts/check_all_connections.py.
+
+Runs the script against an in-memory kernel so the Composio calls it makes
+can be inspected without network access.
+"""
+
+import sys
+import os
+import types
+from types import SimpleNamespace
+
+import pytest
+
+# Add parent and scripts directories to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+pytest.importorskip("dotenv")
+
+DEFAULT_APPS = ["asana", "gmail", "googlecalendar", "slack", "github"]
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def _account(slug, status="ACTIVE"):
+    return SimpleNamespace(id=f"ca_{slug}", status=status, toolkit=SimpleNamespace(slug=slug))
+
+
+class FakeKernel:
+    """Stands in for kernel.AgentKernel and records what the script asks for."""
+
+    instances = []
+    rate_limit_first = False
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.list_calls = []
+        self.setup_apps = "not called"
+        toolkits = SimpleNamespace(items=[
+            SimpleNamespace(name="Gmail", connection=None),
+            SimpleNamespace(name="Asana", connection=None),
+        ])
+        self.composio_session = SimpleNamespace(toolkits=lambda: toolkits)
+        self.composio_client = SimpleNamespace(
+            connected_accounts=SimpleNamespace(list=self._list)
+        )
+        FakeKernel.instances.append(self)
+
+    def _list(self, **kwargs):
+        self.list_calls.append(kwargs)
+        if FakeKernel.rate_limit_first and len(self.list_calls) == 1:
+            raise RateLimited("Too Many Requests")
+        accounts = [_account("gmail"), _account("slack", status="EXPIRED")]
+        if "toolkit_slugs" in kwargs:
+            accounts = [a for a in accounts if a.toolkit.slug in kwargs["toolkit_slugs"]]
+        return SimpleNamespace(items=accounts)
+
+    def setup(self, apps=None):
+        self.setup_apps = apps
+
+    def check_connection(self, app_name):
+        raise AssertionError("section 3 should reuse section 2's listing")
+
+
+def _run(monkeypatch, capsys, **kwargs):
+    FakeKernel.instances.clear()
+    monkeypatch.setitem(sys.modules, "kernel", types.SimpleNamespace(AgentKernel=FakeKernel))
+    import check_all_connections
+    check_all_connections.check_all_connections(**kwargs)
+    return FakeKernel.instances[0], capsys.readouterr().out
+
+
+def test_no_toolkit_flag_checks_everything(monkeypatch, capsys):
+    """Without --toolkit the script lists all accounts once and checks the default apps."""
+    kernel, out = _run(monkeypatch, capsys)
+
+    assert kernel.setup_apps is None
+    assert "Found 2 toolkit(s)" in out
+    assert kernel.list_calls == [{"user_ids": [kernel.user_id]}]
+    assert "✅ Connected: gmail" in out
+    assert "❌ Not Connected: slack" in out  # listed, but not ACTIVE
+    for app in DEFAULT_APPS:
+        assert f": {app}\n" in out
+    print("✅ No-flag run lists all accounts and checks default apps")
+
+
+def test_toolkit_flag_narrows_checks(monkeypatch, capsys):
+    """--toolkit is pushed to the server and limits setup, the toolkit list and the check."""
+    kernel, out = _run(monkeypatch, capsys, toolkit_filter="gmail")
+
+    assert kernel.setup_apps == ["gmail"]
+    assert "Found 1 toolkit(s)" in out and "Asana" not in out
+    assert kernel.list_calls == [{"user_ids": [kernel.user_id], "toolkit_slugs": ["gmail"]}]
+    assert "✅ Connected: gmail" in out and "slack" not in out
+    print("✅ --toolkit narrows setup, the listing and the check")
+
+
+def test_listing_retries_rate_limits(monkeypatch, capsys):
+    """A 429 on the account listing is retried instead of failing the check."""
+    import _composio_cache
+    monkeypatch.setattr(_composio_cache.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(FakeKernel, "rate_limit_first", True)
+
+    kernel, out = _run(monkeypatch, capsys, toolkit_filter="gmail")
+
+    assert len(kernel.list_calls) == 2
+    assert "✅ Connected: gmail" in out
+    print("✅ Listing 429s go through the shared retry")
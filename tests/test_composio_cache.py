@@ -0,0 +1,126 @@
+"""
+Test suite for scripts/_composio_cache.py.
+
+Covers the private on-disk cache and 429 detection and retry in @ratelimited.
+"""
+
+import sys
+import os
+import stat
+
+import pytest
+
+# Add scripts directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+pytest.importorskip("dotenv")
+
+import _composio_cache
+
+
+class FakeSDKError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        if status_code is not None:
+            self.status_code = status_code
+
+
+def test_rate_limit_detection():
+    """Only real 429s count; digits inside ids or messages do not."""
+    assert _composio_cache._is_rate_limited(FakeSDKError("slow down", status_code=429))
+    assert _composio_cache._is_rate_limited(FakeSDKError("Too Many Requests"))
+    assert not _composio_cache._is_rate_limited(FakeSDKError("account ca_42913 not found"))
+    assert not _composio_cache._is_rate_limited(FakeSDKError("Too Many Requests", status_code=500))
+    print("✅ 429 detection ignores stray digits")
+
+
+def test_ratelimited_retries_only_rate_limits(monkeypatch):
+    """429s are retried; any other error is raised on the first attempt."""
+    monkeypatch.setattr(_composio_cache.time, "sleep", lambda seconds: None)
+    calls = []
+
+    @_composio_cache.ratelimited
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise FakeSDKError("slow down", status_code=429)
+        return "ok"
+
+    assert flaky() == "ok"
+    assert len(calls) == 3
+
+    calls.clear()
+
+    @_composio_cache.ratelimited
+    def missing():
+        calls.append(1)
+        raise FakeSDKError("account ca_42913 not found")
+
+    with pytest.raises(FakeSDKError):
+        missing()
+    assert len(calls) == 1
+    print("✅ Non-429 errors are not retried")
+
+
+def _use_tmp_cache(monkeypatch, tmp_path):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(_composio_cache, "CACHE_DIR", cache_dir)
+    return cache_dir
+
+
+def test_cache_files_are_private(monkeypatch, tmp_path):
+    """The cache directory and entries are only accessible to the current user."""
+    cache_dir = _use_tmp_cache(monkeypatch, tmp_path)
+    path = _composio_cache._cache_path("connected_accounts", [])
+
+    _composio_cache._write_cache(path, {"items": ["acct"]})
+
+    assert stat.S_IMODE(cache_dir.stat().st_mode) == 0o700
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    value, age = _composio_cache._read_cache(path, ttl=60)
+    assert value == {"items": ["acct"]}
+    assert age < 60
+    print("✅ Cache entries are written 0600 in a 0700 directory")
+
+
+def test_cache_leaves_existing_dir_permissions(monkeypatch, tmp_path):
+    """A user-supplied cache directory that already exists is not chmodded."""
+    cache_dir = _use_tmp_cache(monkeypatch, tmp_path)
+    cache_dir.mkdir(mode=0o755)
+    os.chmod(cache_dir, 0o755)
+
+    _composio_cache._write_cache(_composio_cache._cache_path("connected_accounts", []), "x")
+
+    assert stat.S_IMODE(cache_dir.stat().st_mode) == 0o755
+    print("✅ Existing cache directories keep their permissions")
+
+
+def test_cache_refuses_foreign_or_writable_files(monkeypatch, tmp_path):
+    """Entries owned by another user or writable by others are never unpickled."""
+    _use_tmp_cache(monkeypatch, tmp_path)
+    path = _composio_cache._cache_path("connected_accounts", [])
+    _composio_cache._write_cache(path, "secret")
+
+    os.chmod(path, 0o666)
+    assert _composio_cache._read_cache(path, ttl=60) == (None, None)
+
+    os.chmod(path, 0o600)
+    monkeypatch.setattr(os, "getuid", lambda: path.stat().st_uid + 1, raising=False)
+    assert _composio_cache._read_cache(path, ttl=60) == (None, None)
+    print("✅ Foreign or group/world-writable cache files are ignored")
+
+
+def test_list_connections_reports_cache_hits(monkeypatch, tmp_path, capsys):
+    """A cached listing is announced so stale data is never shown silently."""
+    _use_tmp_cache(monkeypatch, tmp_path)
+    fetches = []
+    monkeypatch.setattr(_composio_cache, "_fetch_connections", lambda **kw: fetches.append(kw) or ["acct"])
+
+    assert _composio_cache.list_connections() == ["acct"]
+    assert "cached" not in capsys.readouterr().err
+
+    assert _composio_cache.list_connections() == ["acct"]
+    assert "cached" in capsys.readouterr().err
+    assert len(fetches) == 1
+    print("✅ Cache hits are reported on stderr")
@@ -0,0 +1,271 @@
+"""
+Test suite for message delivery helpers.
+
+Tests message dedup, the per-user kernel LRU, per-chat serialization and
+coalescing of identical in-flight requests.
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import message_pipeline
+from message_pipeline import content_key, get_or_create, mark_processed, run_coalesced, run_for_user
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    message_pipeline.processed_messages.clear()
+    message_pipeline.inflight_runs.clear()
+    yield
+    message_pipeline.processed_messages.clear()
+    message_pipeline.inflight_runs.clear()
+
+
+def test_mark_processed_evicts_oldest(monkeypatch):
+    """Duplicates are rejected and the oldest ids are forgotten first."""
+    monkeypatch.setattr(message_pipeline, "MAX_PROCESSED_MESSAGES", 2)
+
+    assert mark_processed("a")
+    assert mark_processed("b")
+    assert not mark_processed("a")  # duplicate; also refreshes "a"
+    assert mark_processed("c")      # evicts "b", the least recently seen
+
+    assert list(message_pipeline.processed_messages) == ["a", "c"]
+    assert mark_processed("b")
+    print("✅ Processed ids are deduped and evicted oldest-first")
+
+
+def test_content_key_requires_timestamp():
+    """Messages without a timestamp skip the content check entirely."""
+    assert content_key({"from": "254@c.us", "body": "ok"}) is None
+    assert content_key({"from": "254@c.us", "body": "ok", "timestamp": 1700000000})
+    print("✅ No timestamp, no content key")
+
+
+def test_same_body_at_new_timestamp_is_not_dropped():
+    """Re-sending the same text later is a new message, not a re-delivery."""
+    first = {"from": "254@c.us", "body": "ok", "timestamp": 1700000000}
+    redelivered = dict(first)
+    later = dict(first, timestamp=1700000060)
+
+    assert mark_processed(content_key(first))
+    assert not mark_processed(content_key(redelivered))
+    assert mark_processed(content_key(later))
+    print("✅ Same body at a new timestamp gets through")
+
+
+def test_kernel_lru_eviction_order():
+    """Hits refresh recency; the least recently used kernel is evicted."""
+    cache = OrderedDict()
+    built = []
+
+    def factory(user_id):
+        built.append(user_id)
+        return f"kernel-{user_id}"
+
+    async def scenario():
+        await get_or_create(cache, "a", factory, max_size=2)
+        await get_or_create(cache, "b", factory, max_size=2)
+        assert await get_or_create(cache, "a", factory, max_size=2) == "kernel-a"
+        await get_or_create(cache, "c", factory, max_size=2)
+
+    asyncio.run(scenario())
+
+    assert list(cache) == ["a", "c"]
+    assert built == ["a", "b", "c"]
+    print("✅ Kernel LRU evicts the least recently used user")
+
+
+def test_kernel_built_once_and_not_cached_on_failure():
+    """Concurrent first messages share one build; a failed build caches nothing."""
+    cache = OrderedDict()
+    built = []
+
+    def slow_factory(user_id):
+        built.append(user_id)
+        time.sleep(0.05)
+        return object()
+
+    def broken_factory(user_id):
+        raise RuntimeError("composio down")
+
+    async def scenario():
+        first, second = await asyncio.gather(
+            get_or_create(cache, "a", slow_factory, max_size=5),
+            get_or_create(cache, "a", slow_factory, max_size=5),
+        )
+        assert first is second
+        with pytest.raises(RuntimeError):
+            await get_or_create(cache, "b", broken_factory, max_size=5)
+
+    asyncio.run(scenario())
+
+    assert built == ["a"]
+    assert "b" not in cache
+    print("✅ Kernel creation is single-flight and failure-safe")
+
+
+def test_cancelled_kernel_build_is_kept():
+    """Cancelling the first message mid-build doesn't start a second build."""
+    cache = OrderedDict()
+    built = []
+
+    def slow_factory(user_id):
+        built.append(user_id)
+        time.sleep(0.05)
+        return f"kernel-{user_id}"
+
+    async def scenario():
+        first = asyncio.create_task(get_or_create(cache, "a", slow_factory, max_size=5))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await get_or_create(cache, "a", slow_factory, max_size=5) == "kernel-a"
+
+    asyncio.run(scenario())
+
+    assert built == ["a"]
+    print("✅ A cancelled build is cached, not repeated")
+
+
+def test_run_for_user_serializes_per_chat():
+    """Calls for one chat never overlap; calls for different chats do."""
+    active = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+    overlap = threading.Event()
+    lock = threading.Lock()
+
+    def call(user_id):
+        with lock:
+            active[user_id] += 1
+            peak[user_id] = max(peak[user_id], active[user_id])
+            if active["a"] and active["b"]:
+                overlap.set()
+        time.sleep(0.05)
+        with lock:
+            active[user_id] -= 1
+
+    async def scenario():
+        await asyncio.gather(
+            run_for_user("a", call, "a"),
+            run_for_user("a", call, "a"),
+            run_for_user("b", call, "b"),
+        )
+
+    asyncio.run(scenario())
+
+    assert peak == {"a": 1, "b": 1}
+    assert overlap.is_set()
+    print("✅ Kernel calls are serialized per chat only")
+
+
+def test_cancelled_call_keeps_chat_locked_until_done():
+    """A cancelled request's thread still finishes before the chat's next call starts."""
+    events = []
+
+    def call(name):
+        events.append(f"start {name}")
+        time.sleep(0.05)
+        events.append(f"end {name}")
+
+    async def scenario():
+        first = asyncio.create_task(run_for_user("a", call, "first"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await run_for_user("a", call, "second")
+
+    asyncio.run(scenario())
+
+    assert events == ["start first", "end first", "start second", "end second"]
+    print("✅ Cancelled calls hold the chat lock until their thread finishes")
+
+
+def test_run_coalesced_shares_result_and_error():
+    """Followers get the leader's result or exception from a single call."""
+    calls = []
+    release = threading.Event()
+
+    def answer(text):
+        calls.append(text)
+        release.wait(1)
+        return text.upper()
+
+    def fail(text):
+        calls.append(text)
+        release.wait(1)
+        raise ValueError("llm down")
+
+    async def scenario():
+        key = ("254@c.us", "hi")
+        leader = asyncio.create_task(run_coalesced(key, answer, "hi"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(run_coalesced(key, answer, "hi"))
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await leader == await follower == "HI"
+
+        release.clear()
+        key = ("254@c.us", "boom")
+        leader = asyncio.create_task(run_coalesced(key, fail, "boom"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(run_coalesced(key, fail, "boom"))
+        await asyncio.sleep(0.01)
+        release.set()
+        for task in (leader, follower):
+            with pytest.raises(ValueError):
+                await task
+
+    asyncio.run(scenario())
+
+    assert calls == ["hi", "boom"]
+    assert message_pipeline.inflight_runs == {}
+    print("✅ Coalesced calls share results and errors")
+
+
+def test_run_coalesced_cancellation():
+    """A cancelled leader doesn't cancel followers; a cancelled follower doesn't stop the leader."""
+    calls = []
+
+    def answer(text):
+        calls.append(text)
+        time.sleep(0.05)
+        return text.upper()
+
+    async def scenario():
+        key = ("254@c.us", "hi")
+        leader = asyncio.create_task(run_coalesced(key, answer, "hi"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(run_coalesced(key, answer, "hi"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == "HI"  # re-ran the call itself
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+        key = ("254@c.us", "yo")
+        leader = asyncio.create_task(run_coalesced(key, answer, "yo"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(run_coalesced(key, answer, "yo"))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        assert await leader == "YO"
+
+    asyncio.run(scenario())
+
+    assert calls == ["hi", "hi", "yo"]
+    assert message_pipeline.inflight_runs == {}
+    print("✅ Cancellation only affects the task that was cancelled")
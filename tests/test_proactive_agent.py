@@ -45,6 +45,16 @@ def test_friction_detection():
         print(f"✅ No friction in: '{msg}'")
 
 
+def test_friction_detection_reports_every_keyword():
+    """Overlapping keywords are all reported, not just the first match."""
+    
+    result = FrictionDetector.detect("Doing this manually every day is tedious")
+    keywords = {fp['keyword'] for fp in result['friction_points']}
+    
+    assert keywords == {'manual', 'manually', 'every day', 'tedious'}
+    print(f"✅ Detected all keywords: {sorted(keywords)}")
+
+
 def test_proactive_prompt_building():
     """Test that proactive prompts are built correctly."""
     
@@ -96,6 +106,8 @@ if __name__ == "__main__":
     try:
         test_friction_detection()
         print()
+        test_friction_detection_reports_every_keyword()
+        print()
         test_proactive_prompt_building()
         print()
         test_should_use_proactive_mode()
@@ -0,0 +1,68 @@
+"""
+Test suite for the composio-auth validate_auth_url script.
+
+Tests batch HTTP validation against a mocked transport (no network).
+"""
+
+import sys
+import os
+
+import pytest
+
+# Add the skill's scripts directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "skills", "composio-auth", "scripts"))
+
+import validate_auth_url
+
+TRUSTED = "https://connect.composio.dev/link/lk_123"
+
+
+def test_batch_trusted_links_skip_network():
+    """Composio secure links are accepted without any HTTP request."""
+    results = validate_auth_url.validate_auth_urls_batch([TRUSTED, TRUSTED])
+
+    assert [r["skipped"] for r in results] == ["trusted_composio_link"] * 2
+    assert all(r["accessible"] for r in results)
+    print("✅ Trusted links validated without network")
+
+
+def test_batch_keeps_order_and_maps_errors():
+    """Results line up with the input URLs and failures map to the single-URL errors."""
+    httpx = pytest.importorskip("httpx")
+    requested = []
+
+    def handler(request):
+        url = str(request.url)
+        requested.append(url)
+        if url.endswith("/ok"):
+            return httpx.Response(200)
+        if url.endswith("/missing"):
+            return httpx.Response(404)
+        if url.endswith("/moved"):
+            return httpx.Response(302, headers={"Location": "https://github.com/ok"})
+        if url.endswith("/slow"):
+            raise httpx.ReadTimeout("timed out", request=request)
+        raise httpx.ConnectError("refused", request=request)
+
+    urls = [
+        "https://github.com/slow",
+        TRUSTED,
+        "https://github.com/ok",
+        "https://github.com/missing",
+        "https://github.com/down",
+        "https://github.com/moved",
+    ]
+    results = validate_auth_url.validate_auth_urls_batch(
+        urls, transport=httpx.MockTransport(handler)
+    )
+
+    assert len(results) == len(urls)
+    assert results[0]["error"] == "Request timed out"
+    assert results[1]["skipped"] == "trusted_composio_link"
+    assert results[2]["accessible"] and results[2]["status_code"] == 200
+    assert not results[3]["accessible"] and results[3]["status_code"] == 404
+    assert results[4]["error"] == "Connection failed"
+    assert results[5]["accessible"] and results[5]["redirect_url"] == "https://github.com/ok"
+    assert TRUSTED not in requested
+    print("✅ Batch results keep input order and map errors")
@@ -32,7 +32,9 @@ let client = null;
 let isReady = false;
 let qrCode = null;
 let connectionStatus = 'disconnected';
+// Insertion-ordered, so the oldest id is always first and can be evicted in O(1)
 const processedMessages = new Set();
+const MAX_PROCESSED_MESSAGES = 1000;
 
 // Ensure tokens folder exists
 if (!fs.existsSync(TOKEN_FOLDER)) {
@@ -110,11 +112,9 @@ function setupEventListeners() {
             if (processedMessages.has(msgId)) return;
             processedMessages.add(msgId);
 
-            // Keep set size manageable
-            if (processedMessages.size > 1000) {
-                const arr = Array.from(processedMessages);
-                processedMessages.clear();
-                arr.slice(-500).forEach(id => processedMessages.add(id));
+            // Keep set size manageable by evicting the oldest id
+            if (processedMessages.size > MAX_PROCESSED_MESSAGES) {
+                processedMessages.delete(processedMessages.values().next().value);
             }
 
             // Skip own messages